@@ -1,10 +1,44 @@
+import math
+import json
 import random
+import time
+from collections import deque
+from itertools import accumulate
+
 import zmq
-import json
+
+from DungeonLibrary import DungeonLibrary
+from ServiceConfig import client_endpoint
 
 # ZeroMQ context
 context = zmq.Context()
 
+# States of the interactive menu flow
+MAIN_MENU = "main_menu"
+GENERATE = "generate"
+REVIEW = "review"
+EXPORT = "export"
+CUSTOM_ELEMENTS = "custom_elements"
+PREVIOUS_DUNGEONS = "previous_dungeons"
+DUNGEON_LIBRARY = "dungeon_library"
+EXIT = "exit"
+
+# Number of previously generated dungeons kept for the current session
+HISTORY_LIMIT = 5
+
+# Limits for the number of rooms in a 'huge' dungeon
+HUGE_ROOM_COUNT = (13, 5000)
+
+# Side length, in map cells, of the space given to each room in a 'huge' dungeon, and how far
+# (as a fraction) each split may stray from an even split of the space
+BSP_CELL_SIZE = 18
+BSP_JITTER = 0.1
+
+# Characters used to mark room contents on the ASCII map
+CONTENT_MARKERS = {"treasure": "$", "monsters": "M", "traps": "^"}
+# Drawn by the map service when a room holds more contents than fit on its floor
+OVERFLOW_MARKER = "&"
+
 
 def main_menu():
     """
@@ -17,36 +51,47 @@ def main_menu():
     print("2. Review Dungeon")
     print("3. Export Dungeon")
     print("4. Custom Elements Menu")
+    print("5. Previous Dungeons")
+    print("6. Dungeon Library")
     print("Or type 'Exit' to quit the program!")
 
     while True:
         choice = input("Please enter your choice: ").strip().lower()
-        if choice in ["1", "2", "3", "4", "Exit", "exit"]:
+        if choice in ["1", "2", "3", "4", "5", "6", "exit"]:
             return choice
         else:
-            print("Invalid choice, please enter 1, 2, 3, 4, or 'Exit'.")
+            print("Invalid choice, please enter 1, 2, 3, 4, 5, 6, or 'Exit'.")
 
 
 def generate_dungeon():
     """
-    Prompts user for dungeon preferences, generates dungeon rooms and corridors,
-    and displays the generated dungeon details if confirmed.
-    Returns a dictionary representing the dungeon.
+    Prompts user for dungeon preferences and generates dungeon rooms and corridors if confirmed.
+    Returns a dictionary representing the dungeon, or None if the user chose to enter new choices.
     """
     dungeon = None
+    difficulty = None
 
     # Prompt user for dungeon size
     print(
         "\nTime to generate your dungeon! Input your choice from the options listed, once complete you will be prompted to confirm your choices.")
-    print(" - Choose a Dungeon Size (small, medium, large):")
+    print(" - Choose a Dungeon Size (small, medium, large, huge):")
     print(" - Dungeon size will determine the scale of the generated map.")
+    print(f" - A huge dungeon lets you choose the number of rooms ({HUGE_ROOM_COUNT[0]} to {HUGE_ROOM_COUNT[1]}).")
     print("Tip: A larger dungeon may take longer to generate.")
 
     size = input("Size: ").lower()
-    while size not in ["small", "medium", "large"]:
-        print("Invalid input. Please enter 'small', 'medium', or 'large'.")
+    while size not in ["small", "medium", "large", "huge"]:
+        print("Invalid input. Please enter 'small', 'medium', 'large', or 'huge'.")
         size = input("Size: ").lower()
 
+    room_count = None
+    if size == "huge":
+        room_count = input("Number of rooms: ").strip()
+        while not room_count.isdigit() or not HUGE_ROOM_COUNT[0] <= int(room_count) <= HUGE_ROOM_COUNT[1]:
+            print(f"Invalid input. Please enter a number from {HUGE_ROOM_COUNT[0]} to {HUGE_ROOM_COUNT[1]}.")
+            room_count = input("Number of rooms: ").strip()
+        room_count = int(room_count)
+
     # Prompt user for corridor complexity
     print("\nChoose Corridor Complexity (simple, realistic, complex):")
     print("Corridor complexity will determine how complex the corridors connecting rooms should be.")
@@ -61,7 +106,7 @@ def generate_dungeon():
         complexity = input("Complexity: ").lower()
 
     # Request treasure details
-    treasure = request_treasure(size)
+    treasure = request_treasure(size, room_count)
 
     # NEW: Request monsters
     hazards = request_monsters_and_traps()
@@ -71,6 +116,8 @@ def generate_dungeon():
     traps = hazards.get("traps", []) if hazards else []
 
     print(f"\nCurrently, you have chosen a '{size}' sized dungeon and '{complexity}' complexity corridors.")
+    if room_count:
+        print(f"Your dungeon will have {room_count} rooms.")
     if treasure:
         print(f"You chose to include {treasure['quality']} treasure.")
     else:
@@ -95,12 +142,21 @@ def generate_dungeon():
     # Generate dungeon based on user input
     # Generate rooms based on size
     if confirmation == 'yes':
-        rooms = generate_rooms(size)  # Store the rooms in a variable
+        # Seed the layout so the rooms and corridors can be reproduced from the library
+        seed = random.randrange(2**32)
+        rng = random.Random(seed)
+        rooms = generate_rooms(size, rng, room_count)  # Store the rooms in a variable
         # Generate corridors based on the rooms
-        corridors = generate_corridors(rooms, complexity)
+        corridors = generate_corridors(rooms, complexity, rng, local=size == "huge")
+        # Place the treasure, monsters and traps in the rooms
+        place_contents(rooms, corridors, treasure.get("items", []) if treasure else [], monsters, traps, rng)
         dungeon = {
             "size": size,
             "complexity": complexity,
+            "difficulty": difficulty,
+            "seed": seed,
+            # Huge dungeons are laid out here, so the map service draws their rooms where they are
+            "layout": "bsp" if size == "huge" else "grid",
             "rooms": rooms,
             "corridors": corridors,
             "treasure": treasure,
@@ -108,21 +164,21 @@ def generate_dungeon():
             "traps": traps,
         }
         print("\nDungeon generated successfully!")
-        review_dungeon(dungeon)
-    elif confirmation == 'no':
-        generate_dungeon()
 
     return dungeon
 
 
-def generate_rooms(size):
+def generate_rooms(size, rng=random, room_count=None):
     room_counts = {"small": (2, 5), "medium": (4, 8), "large": (7, 12)}
     room_sizes = {
         "small": ["10x10", "15x15", "10x15", "15x20", "20x20"],
         "medium": ["15x15", "15x20", "20x20", "25x25", "25x40", "25x30"],
         "large": ["15x15", "15x20", "20x20", "25x25", "25x40", "25x30", "30x40", "40x40", "50x50", "50x60"]
     }
-    num_rooms = random.randint(*room_counts[size])
+    if size == "huge":
+        return generate_bsp_rooms(room_count, room_sizes["large"], rng)
+
+    num_rooms = rng.randint(*room_counts[size])
     rooms = []
 
     grid_size = int(num_rooms**0.5) + 1
@@ -132,49 +188,194 @@ def generate_rooms(size):
         room = {
             "id": i + 1,
             "description": "An empty room",
-            "dimensions": random.choice(room_sizes[size]),
+            "dimensions": rng.choice(room_sizes[size]),
             "position": (x, y)
         }
         rooms.append(room)
 
     return rooms
 
-unique_corridors = set()
+def partition_map(num_rooms, rng=random):
+    """
+    Splits a square map into one region per room using binary space partitioning. Each region is
+    split along its longer side in proportion to the number of rooms each half has to hold, so
+    the regions stay close to square and the work grows linearly with the number of rooms.
+    Returns the regions as (x, y, width, height) in map cells, with neighbouring regions next
+    to each other in the list.
+    """
+    side = math.ceil(math.sqrt(num_rooms)) * BSP_CELL_SIZE
+    regions = []
+    stack = [(0, 0, side, side, num_rooms)]
+    while stack:
+        x, y, width, height, count = stack.pop()
+        if count == 1:
+            regions.append((x, y, width, height))
+            continue
+
+        first = count // 2
+        share = first / count * (1 + rng.uniform(-BSP_JITTER, BSP_JITTER))
+        # Push the second half first so the first half is split next, keeping regions in order
+        if width >= height:
+            split = round(width * share)
+            stack.append((x + split, y, width - split, height, count - first))
+            stack.append((x, y, split, height, first))
+        else:
+            split = round(height * share)
+            stack.append((x, y + split, width, height - split, count - first))
+            stack.append((x, y, width, split, first))
+    return regions
+
 
-def generate_corridors(rooms, complexity):
+def generate_bsp_rooms(num_rooms, room_sizes, rng=random):
+    """
+    Generates rooms for a huge dungeon, placing each one inside its own region of the map so
+    that rooms never overlap. Each room's position is the top left corner of its walls in map cells.
+    """
+    rooms = []
+    for i, (x, y, width, height) in enumerate(partition_map(num_rooms, rng)):
+        # A room needs its size in cells plus two walls, and a free cell on each side
+        fitting = [dimensions for dimensions in room_sizes
+                   if int(dimensions.split('x')[0]) // 5 + 4 <= width
+                   and int(dimensions.split('x')[1]) // 5 + 4 <= height]
+        if fitting:
+            dimensions = rng.choice(fitting)
+        else:
+            dimensions = f"{max(1, width - 4) * 5}x{max(1, height - 4) * 5}"
+        room_width, room_height = (int(value) // 5 for value in dimensions.split('x'))
+
+        room = {
+            "id": i + 1,
+            "description": "An empty room",
+            "dimensions": dimensions,
+            "position": (x + 1 + rng.randint(0, max(0, width - room_width - 4)),
+                         y + 1 + rng.randint(0, max(0, height - room_height - 4)))
+        }
+        rooms.append(room)
+
+    return rooms
+
+def generate_corridors(rooms, complexity, rng=random, local=False):
+    """
+    Connects the rooms in a chain, then adds extra corridors based on complexity.
+    With local set, extra corridors only join rooms a few places apart in the list, which for
+    huge dungeons keeps them between rooms that are near each other on the map.
+    """
     corridors = []
+    # Connections already made in this dungeon, so every dungeon starts with a fresh set
+    unique_corridors = set()
     room_count = len(rooms)
 
     # Connect rooms sequentially
     for i in range(room_count - 1):
-        corridor = add_corridor(rooms[i]['id'], rooms[i+1]['id'])
+        corridor = add_corridor(unique_corridors, rooms[i]['id'], rooms[i+1]['id'])
         if corridor:
             corridors.append(corridor)
 
     # Add extra corridors based on complexity
     if complexity in ["realistic", "complex"]:
-        extra_corridors = random.randint(1, room_count) if complexity == "realistic" or room_count == 2 else random.randint(room_count, room_count * 2)
+        extra_corridors = rng.randint(1, room_count) if complexity == "realistic" or room_count == 2 else rng.randint(room_count, room_count * 2)
         attempts = 0
-        while len(corridors) < room_count - 1 + extra_corridors and attempts < 100:
-            room_a, room_b = random.sample(rooms, 2)
-            corridor = add_corridor(room_a['id'], room_b['id'], is_extra=True)
+        max_attempts = max(100, extra_corridors * 4)
+        while len(corridors) < room_count - 1 + extra_corridors and attempts < max_attempts:
+            if local:
+                index = rng.randrange(room_count - 1)
+                room_a, room_b = rooms[index], rooms[min(room_count - 1, index + rng.randint(2, 5))]
+            else:
+                room_a, room_b = rng.sample(rooms, 2)
+            corridor = add_corridor(unique_corridors, room_a['id'], room_b['id'], is_extra=True)
             if corridor:
                 corridors.append(corridor)
             attempts += 1
 
     return corridors
 
-def add_corridor(room_a, room_b, is_extra=False):
+def add_corridor(unique_corridors, room_a, room_b, is_extra=False):
     if room_a != room_b:
         connection = tuple(sorted([room_a, room_b]))
         if connection not in unique_corridors:
             unique_corridors.add(connection)
             prefix = "Extra corridor" if is_extra else "Corridor"
-            return {"description": f"{prefix} connecting Room {room_a} to Room {room_b}"}
+            return {"description": f"{prefix} connecting Room {room_a} to Room {room_b}", "rooms": [room_a, room_b]}
     return None
 
 
-def request_treasure(size):
+def room_distances(rooms, corridors):
+    """
+    Returns the number of corridors between the entrance (the first room) and every room,
+    found with a breadth-first search over the corridor graph.
+    """
+    neighbours = {room["id"]: [] for room in rooms}
+    for corridor in corridors:
+        room_a, room_b = corridor["rooms"]
+        neighbours[room_a].append(room_b)
+        neighbours[room_b].append(room_a)
+
+    entrance = rooms[0]["id"]
+    distances = {entrance: 0}
+    queue = deque([entrance])
+    while queue:
+        room_id = queue.popleft()
+        for neighbour in neighbours[room_id]:
+            if neighbour not in distances:
+                distances[neighbour] = distances[room_id] + 1
+                queue.append(neighbour)
+    return distances
+
+
+def place_contents(rooms, corridors, treasure_items, monsters, traps, rng=random):
+    """
+    Assigns treasure items, monsters and traps to rooms. Larger rooms and rooms further from
+    the entrance are more likely to hold something. Each room gets a 'contents' dictionary
+    and a description of what is inside.
+    """
+    distances = room_distances(rooms, corridors)
+    unreachable = max(distances.values()) + 1
+
+    # One pass over the rooms to build the cumulative placement weights
+    weights = []
+    for room in rooms:
+        width, height = map(int, room["dimensions"].split('x'))
+        weights.append(width * height * (1 + distances.get(room["id"], unreachable)))
+        room["contents"] = {"treasure": [], "monsters": [], "traps": []}
+    cum_weights = list(accumulate(weights))
+
+    for kind, items in (("treasure", treasure_items), ("monsters", monsters), ("traps", traps)):
+        if items:
+            for room, item in zip(rng.choices(rooms, cum_weights=cum_weights, k=len(items)), items):
+                room["contents"][kind].append(item)
+
+    for room in rooms:
+        room["description"] = describe_contents(room["contents"])
+    return rooms
+
+
+def describe_contents(contents):
+    parts = []
+    for kind, singular in (("treasure", "treasure item"), ("monsters", "monster"), ("traps", "trap")):
+        count = len(contents[kind])
+        if count:
+            parts.append(f"{count} {singular}{'s' if count > 1 else ''}")
+    if not parts:
+        return "An empty room"
+    if len(parts) > 1:
+        parts = [", ".join(parts[:-1]), parts[-1]]
+    return "A room containing " + " and ".join(parts)
+
+
+def room_content_lines(room):
+    """Returns one line for each kind of content placed in a room, for display and export."""
+    contents = room.get("contents", {})
+    return [f"     {kind.capitalize()}: {', '.join(contents[kind])}"
+            for kind in CONTENT_MARKERS if contents.get(kind)]
+
+
+def content_markers(room):
+    """Returns the map markers for a room's contents, e.g. '$$M^'."""
+    contents = room.get("contents", {})
+    return "".join(marker * len(contents.get(kind, [])) for kind, marker in CONTENT_MARKERS.items())
+
+
+def request_treasure(size, room_count=None):
     """
     Prompts the user to decide whether to generate treasure and its quality.
     Returns a dictionary with treasure details or None if skipped.
@@ -209,20 +410,20 @@ def request_treasure(size):
             "dungeon_size": size,
             "treasure_quality": quality_map[treasure_quality]
         }
+        if room_count:
+            request_data["room_count"] = room_count
 
-        socket_server = context.socket(zmq.DEALER)
-        socket_client = context.socket(zmq.DEALER)
-
-        socket_server.bind("tcp://*:5555")
-        socket_client.connect("tcp://localhost:5556")
-
-        poller = zmq.Poller()
-        poller.register(socket_server, zmq.POLLIN)
-
-        socket_client.send_json(request_data)
+        socket = context.socket(zmq.REQ)
+        socket.connect(client_endpoint("treasure"))
+        try:
+            socket.send_json(request_data)
+            treasureRequest = socket.recv_json()
+        finally:
+            socket.close()
 
-        request = socket_server.recv()
-        treasureRequest = json.loads(request)
+        if "error" in treasureRequest:
+            print(f"Error from the treasure microservice: {treasureRequest['error']}")
+            return None
 
         # Return the received treasure data as a dictionary
         return treasureRequest
@@ -257,7 +458,7 @@ def request_monsters_and_traps():
         socket = context.socket(zmq.REQ)
         try:
             print("\nConnecting to the Monsters and Traps microservice...")
-            socket.connect("tcp://localhost:5559")  # Microservice endpoint
+            socket.connect(client_endpoint("hazards"))  # Microservice endpoint
 
             # Send the request
             request_data = {"difficulty": difficulty}
@@ -288,12 +489,17 @@ def request_monsters_and_traps():
 def request_ascii_map(dungeon):
     context = zmq.Context()
     socket = context.socket(zmq.REQ)
-    socket.connect("tcp://localhost:5558")
+    socket.connect(client_endpoint("map"))
 
     layout_data = {
-        "rooms": [{"id": f"room{room['id']}", "dimensions": room["dimensions"]} for room in dungeon["rooms"]],
+        "rooms": [{"id": f"room{room['id']}", "dimensions": room["dimensions"], "markers": content_markers(room)}
+                  for room in dungeon["rooms"]],
         "corridors": [{"description": c["description"]} for c in dungeon["corridors"]]
     }
+    if dungeon.get("layout") == "bsp":
+        # The rooms are already laid out, so the map service only has to draw them
+        for room_data, room in zip(layout_data["rooms"], dungeon["rooms"]):
+            room_data["position"] = list(room["position"])
 
     socket.send_json(layout_data)
     ascii_map = socket.recv_string()
@@ -303,13 +509,28 @@ def request_ascii_map(dungeon):
 
     return ascii_map
 
+def get_ascii_map(dungeon, library=None):
+    """
+    Returns the dungeon's ASCII map, loading it from the library if it was rendered before
+    and only asking the map microservice when it has never been rendered.
+    """
+    if dungeon.get("map") is None:
+        if library and dungeon.get("id"):
+            dungeon["map"] = library.get_map(dungeon["id"])
+        if dungeon.get("map") is None:
+            dungeon["map"] = request_ascii_map(dungeon)
+            if library and dungeon.get("id"):
+                library.save_map(dungeon["id"], dungeon["map"])
+    return dungeon["map"]
+
 def custom_element_menu():
     """Access the memnu for using the custom elements microservice"""
     print("\nHere you can add custom treasure or monsters, which can then be used during random dungeon generation!")
     print("Please choose one of the options below:")
     print("1. Add custom element")
     print("2. View custom elements")
-    print("3. Return to Main Menu")
+    print("3. Import custom elements from a file")
+    print("4. Return to Main Menu")
 
     choice = input("Enter your choice: ")
 
@@ -320,7 +541,10 @@ def custom_element_menu():
         # Option 2: View custom elements (monsters and treasures)
         view_custom_elements()
     elif choice == "3":
-        # Option 3: Return to the main menu
+        # Option 3: Import a pack of custom elements from a JSON file
+        import_custom_elements()
+    elif choice == "4":
+        # Option 4: Return to the main menu
         return
     else:
         print("Invalid choice. Please choose a valid option.")
@@ -338,7 +562,9 @@ def add_custom_element_to_service():
     # Input validation for name
     while True:
         name = input("Enter the name of the element (max 100 characters): ").strip()
-        if len(name) > 100:
+        if not name:
+            print("Name cannot be empty! Please enter a name for the element.")
+        elif len(name) > 100:
             print("Name is too long! Please enter a name with 100 characters or fewer.")
         else:
             break
@@ -353,17 +579,47 @@ def add_custom_element_to_service():
 
     request_data = {"action": "add", "type": element_type, "name": name, "description": description}
     socket = context.socket(zmq.REQ)
-    socket.connect("tcp://localhost:5560")
+    socket.connect(client_endpoint("custom_elements"))
 
     socket.send_json(request_data)
     response = socket.recv_json()
     print(response.get("message", response.get("error")))
 
+def import_custom_elements():
+    """
+    Import many custom elements from a JSON file with a single request to the custom elements service.
+    The file can be a list of elements with a type, name and description, or use the same
+    layout as the service's own file: {"monsters": [...], "treasures": [...]}.
+    """
+    path = input("\nEnter the path of the JSON file to import: ").strip()
+    try:
+        with open(path, "r") as file:
+            pack = json.load(file)
+    except (OSError, ValueError) as e:
+        print(f"Could not read '{path}': {e}")
+        return
+
+    if isinstance(pack, dict):
+        elements = [{"type": element_type, "name": element.get("name"), "description": element.get("description", "")}
+                    for element_type in ["monsters", "treasures"]
+                    for element in pack.get(element_type, []) if isinstance(element, dict)]
+    else:
+        elements = pack
+
+    request_data = {"action": "add_many", "elements": elements}
+    socket = context.socket(zmq.REQ)
+    socket.connect(client_endpoint("custom_elements"))
+
+    socket.send_json(request_data)
+    response = socket.recv_json()
+    socket.close()
+    print(response.get("message", response.get("error")))
+
 def view_custom_elements():
     """Retrieve and display custom elements from the custom elements service."""
     request_data = {"action": "get"}
     socket = context.socket(zmq.REQ)
-    socket.connect("tcp://localhost:5560")
+    socket.connect(client_endpoint("custom_elements"))
 
     socket.send_json(request_data)
     response = socket.recv_json()
@@ -379,19 +635,17 @@ def view_custom_elements():
     for treasure in treasures:
         print(f"- {treasure['name']}: {treasure['description']}")
 
-def review_dungeon(dungeon):
+def review_dungeon(dungeon, library=None):
+    """
+    Displays the dungeon and asks the user what to do next.
+    Returns the next state of the menu flow.
+    """
     if not dungeon:
         print("")
         print("No dungeon has been generated yet. Select '1' below to generate a dungeon or review the other options.")
         choice = display_review_menu()
         print("")
-
-        if choice == '1':
-            generate_dungeon()
-        elif choice == '2':
-            export_dungeon(dungeon)
-        elif choice == '3':
-            return
+        return REVIEW_MENU_STATES[choice]
 
     print("\nHere is your generated dungeon!:")
     print("Size:", dungeon["size"])
@@ -401,6 +655,8 @@ def review_dungeon(dungeon):
     print("\nRooms:")
     for index, room in enumerate(dungeon["rooms"], start=1):
         print(f" - Room {index} - {room['description']} with dimensions {room['dimensions']}")
+        for line in room_content_lines(room):
+            print(line)
 
     # Display corridors
     print("Corridors:")
@@ -408,9 +664,11 @@ def review_dungeon(dungeon):
         print(f" - {corridor['description']}")
 
     # Generate and display ASCII map
-    ascii_map = request_ascii_map(dungeon)
+    ascii_map = get_ascii_map(dungeon, library)
     print("\nASCII Map of the Dungeon:")
     print(ascii_map)
+    print(f"Legend: {CONTENT_MARKERS['treasure']} treasure, {CONTENT_MARKERS['monsters']} monster, "
+          f"{CONTENT_MARKERS['traps']} trap, {OVERFLOW_MARKER} more contents than fit in the room (see the room list)")
 
     # Display treasure
     if dungeon.get("treasure"):
@@ -441,16 +699,14 @@ def review_dungeon(dungeon):
         print("\nNo hazards (monsters or traps) were included in this dungeon.")
 
     choice = display_review_menu()
-
-    if choice == '1':
-        generate_dungeon()
-    elif choice == '2':
-        export_dungeon(dungeon)
-    elif choice == '3':
-        return
+    return REVIEW_MENU_STATES[choice]
 
 
-def export_dungeon(dungeon):
+def export_dungeon(dungeon, library=None):
+    """
+    Exports the dungeon to 'dungeon.txt' if the user confirms.
+    Returns the next state of the menu flow.
+    """
     if not dungeon:
         print("\nNo dungeon to export.")
         print("\nPlease select one of the options below to continue:")
@@ -459,12 +715,10 @@ def export_dungeon(dungeon):
 
         while True:
             choice = input("Please enter your choice: ").lower()
-            if choice in ['1', '2']:
-                if choice == '1':
-                    generate_dungeon()
-                elif choice == '2':
-                    return
-                break
+            if choice == '1':
+                return GENERATE
+            elif choice == '2':
+                return MAIN_MENU
             else:
                 print("Invalid choice, please enter 1 or 2.")
 
@@ -472,10 +726,9 @@ def export_dungeon(dungeon):
         "\nYou are about to export your dungeon, please type 'confirm' to download the dungeon or type 'back' to return to the main menu:")
     export_choice = input("Please type 'confirm' or 'back': ")
 
-    ascii_map = request_ascii_map(dungeon)
-
     # Export to dungeon.txt file in local folder
     if export_choice == 'confirm':
+        ascii_map = get_ascii_map(dungeon, library)
         with open("dungeon.txt", "w") as file:
             file.write("Dungeon Layout\n")
             file.write(f"Size: {dungeon['size']}\n")
@@ -483,6 +736,8 @@ def export_dungeon(dungeon):
             file.write("Rooms:\n")
             for room in dungeon["rooms"]:
                 file.write(f" - {room['description']} with dimensions {room['dimensions']}\n")
+                for line in room_content_lines(room):
+                    file.write(f"{line}\n")
             file.write("Corridors:\n")
             for corridor in dungeon["corridors"]:
                 file.write(f" - {corridor['description']}\n")
@@ -494,7 +749,8 @@ def export_dungeon(dungeon):
     # Return to the main menu
     elif export_choice == 'back':
         print("")
-        return
+
+    return MAIN_MENU
 
 
 def display_review_menu():
@@ -511,30 +767,170 @@ def display_review_menu():
             print("Invalid choice, please enter 1, 2, or 3.")
 
 
-# Main Program Flow
-def main():
-    dungeon = None
+# Next state for each option of the review menu
+REVIEW_MENU_STATES = {'1': GENERATE, '2': EXPORT, '3': MAIN_MENU}
+
+
+def previous_dungeons_menu(session):
+    """
+    Lets the user make one of the dungeons generated earlier in this session the current one.
+    Returns the next state of the menu flow.
+    """
+    history = session["history"]
+    if not history:
+        print("\nNo previous dungeons have been generated this session.")
+        return MAIN_MENU
+
+    print("\nPreviously generated dungeons (most recent first):")
+    for index, dungeon in enumerate(history, start=1):
+        print(f"{index}. A '{dungeon['size']}' dungeon with {len(dungeon['rooms'])} rooms and "
+              f"'{dungeon['complexity']}' corridors")
+    print("Type a number to review that dungeon, or type 'back' to return to the main menu.")
+
     while True:
-        choice = main_menu()
+        choice = input("Please enter your choice: ").strip().lower()
+        if choice == 'back':
+            return MAIN_MENU
+        if choice.isdigit() and 1 <= int(choice) <= len(history):
+            dungeon = history[int(choice) - 1]
+            del history[int(choice) - 1]
+            set_current_dungeon(session, dungeon)
+            return REVIEW
+        print(f"Invalid choice, please enter a number from 1 to {len(history)} or 'back'.")
+
+
+def print_library_entries(entries):
+    if not entries:
+        print("\nNo dungeons found in the library.")
+        return
+    print("\nDungeons in the library (most recent first):")
+    for entry in entries:
+        created = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["created_at"]))
+        print(f" - #{entry['id']} ({created}): '{entry['size']}' size, '{entry['complexity']}' corridors, "
+              f"{entry['room_count']} rooms, hazards: {entry['difficulty'] or 'none'}, "
+              f"treasure: {entry['treasure_quality'] or 'none'}")
+
+
+def dungeon_library_menu(session):
+    """
+    Lets the user browse and search the dungeons saved in the library and reopen one of them.
+    Returns the next state of the menu flow.
+    """
+    library = session["library"]
+    if not library:
+        print("\nThe Dungeon Library is not available in this session.")
+        return MAIN_MENU
+
+    while True:
+        print("\nHere you can reopen any dungeon you have generated before.")
+        print("Please choose one of the options below:")
+        print("1. View recent dungeons")
+        print("2. Search dungeons")
+        print("3. Open a dungeon by number")
+        print("4. Return to Main Menu")
+
+        choice = input("Enter your choice: ").strip()
         if choice == "1":
-            dungeon = generate_dungeon()
+            print_library_entries(library.search())
         elif choice == "2":
-            review_dungeon(dungeon)
+            print("\nLeave an option blank to match any value.")
+            size = input("Size (small, medium, large, huge): ").strip().lower()
+            complexity = input("Complexity (simple, realistic, complex): ").strip().lower()
+            difficulty = input("Hazard difficulty (easy, medium, hard): ").strip().lower()
+            print_library_entries(library.search(size, complexity, difficulty))
         elif choice == "3":
-            export_dungeon(dungeon)
-        elif choice == "4":
-            custom_element_menu()
-        elif choice.lower() == "exit":
-            print("\nAre you sure you want to exit? Your dungeon will not be saved, please export it before exiting.")
-            confirm_choice = input("Type yes to confirm or no to return to select another option: ")
-
-            if confirm_choice == 'yes':
-                print("Exiting the program. Goodbye!")
-                break
-            elif confirm_choice == 'no':
+            dungeon_id = input("Enter the dungeon number: ").strip().lstrip("#")
+            dungeon = library.get(int(dungeon_id)) if dungeon_id.isdigit() else None
+            if dungeon is None:
+                print("No dungeon with that number was found in the library.")
                 continue
+            set_current_dungeon(session, dungeon)
+            return REVIEW
+        elif choice == "4":
+            return MAIN_MENU
         else:
-            print("Invalid choice, please try again.")
+            print("Invalid choice. Please choose a valid option.")
+
+
+# Main Program Flow
+def new_session(library=None):
+    """
+    Create the state for one run of the program: the current dungeon, a bounded history
+    and the dungeon library.
+    """
+    return {"dungeon": None, "history": deque(maxlen=HISTORY_LIMIT), "library": library}
+
+
+def set_current_dungeon(session, dungeon):
+    """Make a dungeon the current one, moving the previous dungeon into the history."""
+    if session["dungeon"] is not None:
+        session["history"].appendleft(session["dungeon"])
+    session["dungeon"] = dungeon
+
+
+def handle_main_menu(session):
+    choice = main_menu()
+    if choice == "exit":
+        print("\nAre you sure you want to exit? Your dungeons are kept in the Dungeon Library, but export them "
+              "if you want a copy in 'dungeon.txt'.")
+        confirm_choice = input("Type yes to confirm or no to return to select another option: ")
+
+        if confirm_choice == 'yes':
+            print("Exiting the program. Goodbye!")
+            return EXIT
+        return MAIN_MENU
+    return MAIN_MENU_STATES[choice]
+
+
+def handle_generate(session):
+    dungeon = generate_dungeon()
+    if dungeon is None:
+        # The user chose to enter new choices
+        return GENERATE
+    if session["library"]:
+        dungeon["id"] = session["library"].save(dungeon)
+    set_current_dungeon(session, dungeon)
+    return REVIEW
+
+
+def handle_review(session):
+    return review_dungeon(session["dungeon"], session["library"])
+
+
+def handle_export(session):
+    return export_dungeon(session["dungeon"], session["library"])
+
+
+def handle_custom_elements(session):
+    custom_element_menu()
+    return MAIN_MENU
+
+
+# Next state for each option of the main menu
+MAIN_MENU_STATES = {"1": GENERATE, "2": REVIEW, "3": EXPORT, "4": CUSTOM_ELEMENTS, "5": PREVIOUS_DUNGEONS,
+                    "6": DUNGEON_LIBRARY}
+
+# Handler for each state; every handler returns the next state
+STATE_HANDLERS = {
+    MAIN_MENU: handle_main_menu,
+    GENERATE: handle_generate,
+    REVIEW: handle_review,
+    EXPORT: handle_export,
+    CUSTOM_ELEMENTS: handle_custom_elements,
+    PREVIOUS_DUNGEONS: previous_dungeons_menu,
+    DUNGEON_LIBRARY: dungeon_library_menu,
+}
+
+
+def main():
+    library = DungeonLibrary()
+    session = new_session(library)
+    state = MAIN_MENU
+    try:
+        while state != EXIT:
+            state = STATE_HANDLERS[state](session)
+    finally:
+        library.close()
 
 
 if __name__ == "__main__":
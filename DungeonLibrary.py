@@ -0,0 +1,116 @@
+import json
+import sqlite3
+import time
+
+# Default location of the on-disk dungeon library
+LIBRARY_FILE = "dungeon_library.db"
+
+# Dungeon fields kept in the JSON payload column; everything else is a searchable column
+PAYLOAD_FIELDS = ["layout", "rooms", "corridors", "treasure", "monsters", "traps"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dungeons (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    size TEXT NOT NULL,
+    complexity TEXT NOT NULL,
+    difficulty TEXT,
+    treasure_quality TEXT,
+    seed INTEGER,
+    room_count INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    map_text TEXT
+);
+CREATE INDEX IF NOT EXISTS dungeons_by_options ON dungeons (size, complexity, difficulty);
+CREATE INDEX IF NOT EXISTS dungeons_by_difficulty ON dungeons (difficulty);
+"""
+
+SUMMARY_COLUMNS = "id, created_at, size, complexity, difficulty, treasure_quality, seed, room_count"
+
+
+class DungeonLibrary:
+    """
+    Stores every generated dungeon in a SQLite file so it can be reopened and exported later
+    without regenerating it or calling the microservices again.
+    The rendered map is kept in its own column and is only read when it is asked for.
+    """
+
+    def __init__(self, path=LIBRARY_FILE):
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+
+    def save(self, dungeon):
+        """Store a dungeon and return its library id."""
+        treasure = dungeon.get("treasure")
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO dungeons (created_at, size, complexity, difficulty, treasure_quality, seed, "
+                "room_count, payload, map_text) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    time.time(),
+                    dungeon["size"],
+                    dungeon["complexity"],
+                    dungeon.get("difficulty"),
+                    treasure.get("quality") if treasure else None,
+                    dungeon.get("seed"),
+                    len(dungeon["rooms"]),
+                    json.dumps({field: dungeon.get(field) for field in PAYLOAD_FIELDS}),
+                    dungeon.get("map"),
+                ),
+            )
+        return cursor.lastrowid
+
+    def save_map(self, dungeon_id, ascii_map):
+        """Store the rendered ASCII map of a dungeon."""
+        with self.connection:
+            self.connection.execute("UPDATE dungeons SET map_text = ? WHERE id = ?", (ascii_map, dungeon_id))
+
+    def get(self, dungeon_id):
+        """
+        Load a dungeon by id, without its map text.
+        Returns the dungeon dictionary or None if there is no such dungeon.
+        """
+        row = self.connection.execute(
+            f"SELECT {SUMMARY_COLUMNS}, payload FROM dungeons WHERE id = ?", (dungeon_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        dungeon = {
+            "id": row["id"],
+            "size": row["size"],
+            "complexity": row["complexity"],
+            "difficulty": row["difficulty"],
+            "seed": row["seed"],
+        }
+        dungeon.update(json.loads(row["payload"]))
+        return dungeon
+
+    def get_map(self, dungeon_id):
+        """Return the stored ASCII map of a dungeon, or None if it has not been rendered yet."""
+        row = self.connection.execute("SELECT map_text FROM dungeons WHERE id = ?", (dungeon_id,)).fetchone()
+        return row["map_text"] if row else None
+
+    def search(self, size=None, complexity=None, difficulty=None, limit=20):
+        """
+        Find dungeons matching all of the given options, most recent first.
+        Returns summary dictionaries (no rooms, corridors or map).
+        """
+        conditions = []
+        parameters = []
+        for column, value in (("size", size), ("complexity", complexity), ("difficulty", difficulty)):
+            if value:
+                conditions.append(f"{column} = ?")
+                parameters.append(value)
+
+        query = f"SELECT {SUMMARY_COLUMNS} FROM dungeons"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY id DESC LIMIT ?"
+        parameters.append(limit)
+
+        return [dict(row) for row in self.connection.execute(query, parameters)]
+
+    def close(self):
+        self.connection.close()
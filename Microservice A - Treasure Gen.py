@@ -1,8 +1,7 @@
 import zmq
-import json
 import random
 
-context = zmq.Context()
+from ServiceConfig import attach_server_socket, is_ping
 
 low_quality = {
                   "Weapons" : {
@@ -30,7 +29,7 @@ low_quality = {
                       "25 copper coins",
                       "50 copper coins"
                   }
-              },
+              }
 medium_quality = {
                      "Weapons" : {
                          "iron broadsword",
@@ -61,7 +60,7 @@ medium_quality = {
                          "50 silver coins",
                          "75 copper coins"
                      }
-                 },
+                 }
 high_quality = {
     "Weapons" : {
         "Mythril Flamberg",
@@ -94,67 +93,72 @@ high_quality = {
     }
 }
 
-returnJson = {
-    "Treasure" : {
-    }
+QUALITY_TABLES = {
+    "low quality": low_quality,
+    "low_quality": low_quality,
+    "medium quality": medium_quality,
+    "middle_quality": medium_quality,
+    "high quality": high_quality,
+    "high_quality": high_quality,
 }
 
-print("Client attempting to connect to server...")
-
-socket_server = context.socket(zmq.DEALER)
-socket_client = context.socket(zmq.DEALER)
-
-socket_server.bind("tcp://*:5556")
-socket_client.connect("tcp://localhost:5555")
-
-poller = zmq.Poller()
-
-poller.register(socket_server, zmq.POLLIN)
+TREASURE_AMOUNTS = {"small": (2, 4), "medium": (4, 7), "large": (7, 10)}
+
+
+def generate_treasure(size, quality, room_count=None):
+    """
+    Generates treasure for a dungeon of the given size and quality.
+    Huge dungeons get treasure for roughly half to all of their rooms.
+    Returns the treasure grouped by type along with a flat list of items.
+    """
+    table = QUALITY_TABLES.get(str(quality).lower())
+    if table is None:
+        return {"error": f"Invalid treasure quality: {quality}"}
+    if size == "huge":
+        if not isinstance(room_count, int) or room_count < 1:
+            return {"error": f"Invalid room count for a huge dungeon: {room_count}"}
+    elif size not in TREASURE_AMOUNTS:
+        return {"error": f"Invalid dungeon size: {size}"}
+
+    #Establish the size of the dungeon
+    if size == "huge":
+        treasureAmount = random.randint(max(1, room_count // 2), room_count)
+    else:
+        treasureAmount = random.randrange(*TREASURE_AMOUNTS[size])
 
+    #Loop through chosen quality dictionary, adding to the result until "treasureAmount" been reached
+    treasure = {}
+    items = []
+    for i in range(treasureAmount):
+        treasureType = random.choice(list(table.keys()))
+        treasureItem = random.choice(sorted(table[treasureType]))
+        treasure.setdefault(treasureType, []).append(treasureItem)
+        items.append(treasureItem)
 
+    return {"quality": quality, "items": items, "Treasure": treasure}
 
-#get request from main
-request = socket_server.recv()
-treasureRequest = json.loads(request)
-size = treasureRequest["dungeon_size"]
-quality = treasureRequest["treasure_quality"]
 
+def main():
+    # Set up ZeroMQ communication
+    context = zmq.Context()
+    socket = context.socket(zmq.REP)
+    endpoint = attach_server_socket(socket, "treasure")
 
-print(f"Request Received. Dungeon size: {size}  Dungeon Quality: {quality}")
+    print(f"Treasure Generation Microservice is running on {endpoint}...")
 
-#Establish the size of the dungeon
-if size == "small":
-    treasureAmount = random.randrange(2,4)
-elif size == "medium":
-    treasureAmount = random.randrange(4, 7)
-elif size == "large":
-    treasureAmount = random.randrange(7, 10)
+    while True:
+        #get request from main
+        treasureRequest = socket.recv_json()
+        if is_ping(treasureRequest):
+            socket.send_json({"status": "ok"})
+            continue
 
-#Establish the quality of dungeon
-if quality == "low_quality":
-    quality = low_quality
-elif quality == "middle_quality":
-    quality = medium_quality
-elif quality == "high_quality":
-    quality = high_quality
+        size = treasureRequest.get("dungeon_size")
+        quality = treasureRequest.get("treasure_quality")
+        print(f"Request Received. Dungeon size: {size}  Dungeon Quality: {quality}")
 
-#Loop through chosen quality dictionary, adding to JSON dict until "treasureAmount" been reached
-for i in range(treasureAmount):
-    treasureType = random.choice(list(quality.keys()))
-    treasureItem = random.choice(list(quality[treasureType]))
-    update = {treasureType : treasureItem}
-    if treasureType in returnJson["Treasure"]:
-        if isinstance(returnJson["Treasure"][treasureType], list):
-            overlap = returnJson["Treasure"][treasureType]
-        else:
-            overlap = [(returnJson["Treasure"][treasureType])]
-        overlap.append(update[treasureType])
-        update = {treasureType : overlap}
-        returnJson["Treasure"].update(update)
-    else:
-        returnJson["Treasure"].update(update)
+        socket.send_json(generate_treasure(size, quality, treasureRequest.get("room_count")))
 
-returnJson = json.dumps(returnJson)
 
-socket_client.send_json(returnJson)
-socket_client.send_string("Q")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
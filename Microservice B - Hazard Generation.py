@@ -2,6 +2,8 @@ import random
 import zmq
 import json
 
+from ServiceConfig import attach_server_socket, client_endpoint, is_ping
+
 # Predefined data for monsters and traps
 MONSTERS_AND_TRAPS = {
     "easy": {
@@ -24,7 +26,7 @@ def get_custom_monsters():
     try:
         context = zmq.Context()
         socket = context.socket(zmq.REQ)
-        socket.connect("tcp://localhost:5560")  # Custom elements service address
+        socket.connect(client_endpoint("custom_elements"))  # Custom elements service address
 
         # Request to get custom monsters
         request = {"action": "get"}
@@ -65,13 +67,17 @@ def main():
     # Set up ZeroMQ communication
     context = zmq.Context()
     socket = context.socket(zmq.REP)
-    socket.bind("tcp://*:5559")
+    endpoint = attach_server_socket(socket, "hazards")
 
-    print("Monster and Trap Generation Microservice is running...")
+    print(f"Monster and Trap Generation Microservice is running on {endpoint}...")
 
     while True:
         # Receive request
         message = socket.recv_json()
+        if is_ping(message):
+            socket.send_json({"status": "ok"})
+            continue
+
         difficulty = message.get("difficulty")
         print(f"Received request for difficulty: {difficulty}")
 
@@ -0,0 +1,55 @@
+import os
+
+# Default ports for every service in the system. Each one can be overridden with an
+# environment variable named DUNGEON_<SERVICE>_PORT, e.g. DUNGEON_HAZARDS_PORT=6559.
+DEFAULT_PORTS = {
+    "treasure": 5556,
+    "map": 5558,
+    "hazards": 5559,
+    "custom_elements": 5560,
+}
+
+# When a service runs with more than one worker, the supervisor binds the public port
+# itself and hands requests to the workers through a backend port at this offset.
+BACKEND_PORT_OFFSET = 1000
+
+# Environment variable the supervisor uses to tell a worker to connect to a backend
+# endpoint instead of binding the public port.
+BACKEND_ENV = "DUNGEON_{}_BACKEND"
+
+HOST = os.environ.get("DUNGEON_HOST", "localhost")
+
+
+def get_port(service):
+    """Return the public port for a service, honouring any environment override."""
+    override = os.environ.get(f"DUNGEON_{service.upper()}_PORT")
+    return int(override) if override else DEFAULT_PORTS[service]
+
+
+def get_backend_port(service):
+    """Return the port workers connect to when the supervisor load-balances a service."""
+    return get_port(service) + BACKEND_PORT_OFFSET
+
+
+def client_endpoint(service):
+    """Return the address a client should connect to in order to reach a service."""
+    return f"tcp://{HOST}:{get_port(service)}"
+
+
+def attach_server_socket(socket, service):
+    """
+    Bind a service's REP socket to its public port, or connect it to the supervisor's
+    backend when it is running as one of several workers.
+    """
+    backend = os.environ.get(BACKEND_ENV.format(service.upper()))
+    if backend:
+        socket.connect(backend)
+        return backend
+    endpoint = f"tcp://*:{get_port(service)}"
+    socket.bind(endpoint)
+    return endpoint
+
+
+def is_ping(message):
+    """Return True if a request is a readiness probe sent by the supervisor."""
+    return isinstance(message, dict) and message.get("action") == "ping"
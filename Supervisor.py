@@ -0,0 +1,331 @@
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import zmq
+from zmq.devices import ThreadDevice
+
+import DungeonGen
+from ServiceConfig import BACKEND_ENV, client_endpoint, get_backend_port, get_port
+
+# ZeroMQ context used for readiness and health probes
+context = zmq.Context()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Every service the dungeon generator depends on, in the order they should be started.
+# Custom Elements comes first because the hazard service asks it for custom monsters.
+SERVICES = {
+    "custom_elements": "Microservice C - Custom Elements",
+    "treasure": "Microservice A - Treasure Gen.py",
+    "hazards": "Microservice B - Hazard Generation.py",
+    "map": "Microservice D - Map Generation",
+}
+
+# Readiness probes during start-up are short; health probes afterwards allow for slow
+# requests (e.g. drawing a very large map) that the worker has to finish first.
+PROBE_TIMEOUT_MS = 500
+HEALTH_PROBE_TIMEOUT_MS = 5000
+READY_TIMEOUT = 15.0
+CHECK_INTERVAL = 1.0
+MAX_PROBE_FAILURES = 3
+STOP_TIMEOUT = 5.0
+
+# A worker that exits within STABLE_RUN_TIME seconds of starting counts as a crash. Crashed
+# workers are restarted after an exponential backoff, and given up on after MAX_RESTARTS
+# crashes in a row.
+STABLE_RUN_TIME = 10.0
+RESTART_BACKOFF = 0.5
+MAX_RESTART_BACKOFF = 30.0
+MAX_RESTARTS = 5
+
+
+def probe(service, timeout_ms=PROBE_TIMEOUT_MS):
+    """
+    Send a readiness probe to a service over its public socket.
+    Returns True if the service answered within the timeout.
+    """
+    socket = context.socket(zmq.REQ)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.setsockopt(zmq.RCVTIMEO, timeout_ms)
+    socket.setsockopt(zmq.SNDTIMEO, timeout_ms)
+    try:
+        socket.connect(client_endpoint(service))
+        socket.send_json({"action": "ping"})
+        socket.recv()
+        return True
+    except zmq.ZMQError:
+        return False
+    finally:
+        socket.close()
+
+
+class ServiceGroup:
+    """One service and the worker processes that serve it."""
+
+    def __init__(self, name, script, workers, log_dir):
+        self.name = name
+        self.script = os.path.join(BASE_DIR, script)
+        self.workers = [None] * workers
+        self.log_dir = log_dir
+        self.device = None
+        self.probe_failures = 0
+        # Per worker: when it last started, its crashes in a row, when to restart it
+        # after a crash, and whether the supervisor has given up on it
+        self.started_at = [0.0] * workers
+        self.crashes = [0] * workers
+        self.retry_at = [None] * workers
+        self.given_up = [False] * workers
+
+    @property
+    def failed(self):
+        """True once the supervisor has given up on every worker of this service."""
+        return all(self.given_up)
+
+    def start(self):
+        # With several workers the supervisor owns the public port and load-balances
+        # requests across the workers, which connect to a private backend port.
+        if len(self.workers) > 1:
+            self.device = ThreadDevice(zmq.QUEUE, zmq.ROUTER, zmq.DEALER)
+            self.device.bind_in(f"tcp://*:{get_port(self.name)}")
+            self.device.bind_out(f"tcp://127.0.0.1:{get_backend_port(self.name)}")
+            self.device.start()
+
+        for index in range(len(self.workers)):
+            self.workers[index] = self.spawn(index)
+
+    def spawn(self, index):
+        env = dict(os.environ)
+        if self.device is not None:
+            env[BACKEND_ENV.format(self.name.upper())] = f"tcp://127.0.0.1:{get_backend_port(self.name)}"
+
+        if self.log_dir:
+            log = open(os.path.join(self.log_dir, f"{self.name}-{index + 1}.log"), "a")
+        else:
+            log = None
+
+        # Start workers outside the supervisor's process group so Ctrl+C only reaches the
+        # supervisor, which then stops them itself
+        if os.name == "nt":
+            isolation = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+        else:
+            isolation = {"start_new_session": True}
+
+        process = subprocess.Popen(
+            [sys.executable, "-u", self.script],
+            cwd=BASE_DIR,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT if log else None,
+            **isolation,
+        )
+        if log:
+            log.close()
+        self.started_at[index] = time.monotonic()
+        self.retry_at[index] = None
+        return process
+
+    def restart_exited(self):
+        """
+        Restart any worker that has crashed or exited, backing off when a worker keeps crashing
+        and giving up on it after MAX_RESTARTS crashes in a row. Returns the number restarted.
+        """
+        restarted = 0
+        now = time.monotonic()
+        for index, process in enumerate(self.workers):
+            if self.given_up[index]:
+                continue
+            if process is None:
+                # Waiting out the backoff after a crash
+                if self.retry_at[index] is not None and now >= self.retry_at[index]:
+                    self.workers[index] = self.spawn(index)
+                    restarted += 1
+                continue
+            if process.poll() is None:
+                continue
+
+            if now - self.started_at[index] < STABLE_RUN_TIME:
+                self.crashes[index] += 1
+            else:
+                self.crashes[index] = 0
+            self.workers[index] = None
+
+            if self.crashes[index] > MAX_RESTARTS:
+                print(f"[supervisor] {self.name} worker {index + 1} exited with code {process.returncode} "
+                      f"after {MAX_RESTARTS} restarts in a row, giving up on it. Check its log for the error.")
+                self.given_up[index] = True
+                continue
+
+            delay = min(RESTART_BACKOFF * 2 ** (self.crashes[index] - 1), MAX_RESTART_BACKOFF) if self.crashes[index] else 0
+            print(f"[supervisor] {self.name} worker {index + 1} exited with code {process.returncode}, "
+                  f"restarting in {delay:.1f}s...")
+            self.retry_at[index] = now + delay
+            if delay == 0:
+                self.workers[index] = self.spawn(index)
+                restarted += 1
+        return restarted
+
+    def restart_all(self):
+        print(f"[supervisor] {self.name} stopped answering probes, restarting its workers...")
+        self.stop()
+        for index in range(len(self.workers)):
+            if not self.given_up[index]:
+                self.workers[index] = self.spawn(index)
+        self.probe_failures = 0
+
+    def stop(self):
+        for process in self.workers:
+            if process is not None and process.poll() is None:
+                process.terminate()
+        deadline = time.monotonic() + STOP_TIMEOUT
+        for process in self.workers:
+            if process is None:
+                continue
+            try:
+                process.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+
+class Supervisor:
+    """Starts every service, waits until they are ready and keeps them running."""
+
+    def __init__(self, workers, log_dir=None):
+        self.groups = [ServiceGroup(name, script, workers.get(name, 1), log_dir)
+                       for name, script in SERVICES.items()]
+        self.running = False
+        # Held during each round of health checks so shutdown never races a restart
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.running = True
+        for group in self.groups:
+            print(f"[supervisor] Starting {group.name} ({len(group.workers)} worker(s)) on port {get_port(group.name)}...")
+            group.start()
+
+    def wait_until_ready(self, timeout=READY_TIMEOUT):
+        """Block until every service answers a probe. Returns the names of any that never did."""
+        pending = list(self.groups)
+        failed = []
+        deadline = time.monotonic() + timeout
+        while pending and time.monotonic() < deadline:
+            for group in list(pending):
+                group.restart_exited()
+                if group.failed:
+                    pending.remove(group)
+                    failed.append(group)
+                elif probe(group.name):
+                    print(f"[supervisor] {group.name} is ready.")
+                    pending.remove(group)
+            if pending:
+                time.sleep(0.1)
+        return [group.name for group in failed + pending]
+
+    def check(self):
+        """Run one round of health checks, restarting dead or unresponsive workers."""
+        with self.lock:
+            for group in self.groups:
+                if not self.running:
+                    return
+                group.restart_exited()
+                if group.failed:
+                    continue
+                if probe(group.name, HEALTH_PROBE_TIMEOUT_MS):
+                    group.probe_failures = 0
+                else:
+                    group.probe_failures += 1
+                    if group.probe_failures >= MAX_PROBE_FAILURES:
+                        group.restart_all()
+
+    def monitor(self, interval=CHECK_INTERVAL):
+        while self.running:
+            self.check()
+            time.sleep(interval)
+
+    def stop(self):
+        self.running = False
+        with self.lock:
+            for group in reversed(self.groups):
+                print(f"[supervisor] Stopping {group.name}...")
+                group.stop()
+
+
+def parse_workers(values):
+    """Parse '--workers name=count' options into a dictionary of worker counts."""
+    workers = {}
+    for value in values:
+        if "=" in value:
+            name, count = value.split("=", 1)
+            names = [name]
+        else:
+            count = value
+            names = list(SERVICES)
+        for name in names:
+            if name not in SERVICES:
+                raise argparse.ArgumentTypeError(f"Unknown service '{name}', expected one of: {', '.join(SERVICES)}")
+            if not count.isdigit() or int(count) < 1:
+                raise argparse.ArgumentTypeError(f"Invalid worker count '{count}' for {name}")
+            workers[name] = int(count)
+    return workers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Start and supervise all of the dungeon generator services.")
+    parser.add_argument("--workers", action="append", default=[], metavar="[SERVICE=]N",
+                        help="number of workers to run, for every service or for one named service")
+    parser.add_argument("--log-dir", default="logs",
+                        help="directory for service output (use an empty value to print it to the console)")
+    parser.add_argument("--client", action="store_true",
+                        help="run the dungeon generator once all services are ready and stop them when it exits")
+    args = parser.parse_args()
+
+    try:
+        workers = parse_workers(args.workers)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    log_dir = os.path.join(BASE_DIR, args.log_dir) if args.log_dir else None
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+
+    supervisor = Supervisor(workers, log_dir)
+
+    def handle_signal(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    try:
+        supervisor.start()
+        not_ready = supervisor.wait_until_ready()
+        if not_ready:
+            print(f"[supervisor] These services did not become ready: {', '.join(not_ready)}")
+            return 1
+        print("[supervisor] All services are ready.")
+
+        if args.client:
+            threading.Thread(target=supervisor.monitor, daemon=True).start()
+            DungeonGen.main()
+        else:
+            print("[supervisor] Press Ctrl+C to stop all services.")
+            supervisor.monitor()
+    except KeyboardInterrupt:
+        print("\n[supervisor] Shutting down...")
+    finally:
+        # Ignore further Ctrl+C or SIGTERM so a repeated signal cannot interrupt shutdown
+        # and leave workers running on their ports
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        supervisor.stop()
+        context.term()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())